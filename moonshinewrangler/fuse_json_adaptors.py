@@ -31,10 +31,17 @@ class RangeAdaptor:
         self.max_out = max_out
         self.format = format
         self.suffix = suffix
+        # The terms below do not depend on the value being adapted,
+        # so they are worked out once here rather than on every call
+        # to adapt(), which runs for every parameter of every preset.
+        self._tolerate_fuse_indicators = (min_in == 0x0300 and max_in == 0xFF00)
+        self._span_in = max_in - min_in
+        self._span_out = max_out - min_out
+        self._type_out = int if isinstance(min_out, int) else float
 
     def adapt(self, value_in):
         value_out = None
-        if self.min_in == 0x0300 and self.max_in == 0xFF00:
+        if self._tolerate_fuse_indicators:
             # Values 0, 256 and 65535 fall outside the usual range
             # for conversion of FUSE u16 values but seem to be
             # used (perhaps as indicator values, maybe the
@@ -49,18 +56,14 @@ class RangeAdaptor:
                 assert value_in == 65535
                 value_out = self.max_out
         if value_out is None:
-            numerator = ((value_in - self.min_in) * (self.max_out - self.min_out))
-            denominator = (self.max_in - self.min_in)
-            value_out = self.min_out + (numerator / denominator)
+            numerator = ((value_in - self.min_in) * self._span_out)
+            value_out = self.min_out + (numerator / self._span_in)
         value_out_str = None
         if self.format is not None:
             value_out_str = format(value_out, self.format)
         else:
             value_out_str = str(value_out)
-        if isinstance(self.min_out, int):
-            return int(value_out_str), value_out_str + self.suffix
-        else:
-            return float(value_out_str), value_out_str + self.suffix
+        return self._type_out(value_out_str), value_out_str + self.suffix
 
 
 # I choose to round continuous/float values in JSON to 3 decimal
@@ -118,10 +121,16 @@ class StringChoiceParameterAdaptor:
         json_strings,
         ui_strings
     ):
-        self.json_strings = json_strings
+        # The FUSE value is used directly as an index into json_strings
+        self.json_strings = tuple(json_strings)
         self.ui_strings = ui_strings
-        self.fuse_to_json = lambda v: self.json_strings[v]
-        self.json_to_ui = lambda v: self.ui_strings[v]
+        assert all(js in ui_strings for js in self.json_strings), json_strings
+
+    def fuse_to_json(self, fuse_value):
+        return self.json_strings[fuse_value]
+
+    def json_to_ui(self, json_value):
+        return self.ui_strings[json_value]
 
 
 class BooleanParameterAdaptor:
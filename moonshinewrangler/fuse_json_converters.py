@@ -8,16 +8,60 @@
 # and Mustang Micro Plus amps (possibly also Mustang GT- and GTX- series
 # but I don't have access to any of those at present).
 
-from collections import namedtuple
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from functools import lru_cache
+import io
+import os
 import traceback
+import xml.etree.ElementTree as _stdlib_ET
+
+try:
+    # lxml builds the tree in C, so it is preferred where it is
+    # installed.  Comments and processing instructions are dropped
+    # so that the converter sees the same elements as it would
+    # from the stdlib parser.
+    from lxml import etree as ET
+    _USING_LXML = True
+    _XML_PARSER = ET.XMLParser(
+        remove_blank_text=True, remove_comments=True, remove_pis=True
+    )
+except ImportError:
+    import xml.etree.ElementTree as ET
+    _USING_LXML = False
+    _XML_PARSER = None
 
 from fuse_json_adaptors import RangeAdaptor as RA
 from fuse_json_adaptors import ContinuousValuedParameterAdaptor as CVPA
 from fuse_json_adaptors import StringChoiceParameterAdaptor as SCPA
 from fuse_json_adaptors import BooleanParameterAdaptor as BPA
 
-EditableParamConverter = namedtuple("EditableParamConverter", "json_param_name ui_param_name parameter_adaptor")
-HiddenParamConverter = namedtuple("HiddenParamConverter", "json_param_name parameter_adaptor")
+
+# The adaptor's conversion methods are bound once when each param
+# converter is created and kept alongside parameter_adaptor.
+
+@dataclass(frozen=True, slots=True)
+class EditableParamConverter:
+    json_param_name: str
+    ui_param_name: str
+    parameter_adaptor: object
+    fuse_to_json_fn: object = field(init=False, repr=False, compare=False)
+    json_to_ui_fn: object = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "fuse_to_json_fn", self.parameter_adaptor.fuse_to_json)
+        object.__setattr__(self, "json_to_ui_fn", self.parameter_adaptor.json_to_ui)
+
+
+@dataclass(frozen=True, slots=True)
+class HiddenParamConverter:
+    json_param_name: str
+    parameter_adaptor: object
+    fuse_to_json_fn: object = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "fuse_to_json_fn", self.parameter_adaptor.fuse_to_json)
+
 
 # The majority of parameters are continuous values
 # represented as a u16 in FUSE files, and as a float
@@ -75,7 +119,37 @@ low_med_hi_max_scpa = SCPA(
 )
 
 
-ModuleConverter = namedtuple("ModuleConverter", "fuse_type fuse_id json_id ui_name param_converters")
+@dataclass(frozen=True, slots=True)
+class ModuleConverter:
+    fuse_type: str
+    fuse_id: int
+    json_id: str
+    ui_name: str
+    param_converters: dict
+    # Indexed by FUSE control index, each entry is either None
+    # (no converter) or a tuple of
+    # (json_param_name, fuse_to_json, ui_param_name, json_to_ui)
+    # with the adaptor methods already bound, so that
+    # convert_fuse_module does not need to inspect the param
+    # converter for every parameter it processes.
+    # ui_param_name and json_to_ui are None for hidden params.
+    param_plan: list = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        param_plan = [None] * (max(self.param_converters, default=-1) + 1)
+        for fuse_param_id, pc in self.param_converters.items():
+            if isinstance(pc, EditableParamConverter):
+                assert len(pc.ui_param_name) > 0
+                param_plan[fuse_param_id] = (
+                    pc.json_param_name, pc.fuse_to_json_fn,
+                    pc.ui_param_name, pc.json_to_ui_fn
+                )
+            else:
+                param_plan[fuse_param_id] = (
+                    pc.json_param_name, pc.fuse_to_json_fn,
+                    None, None
+                )
+        object.__setattr__(self, "param_plan", param_plan)
 
 
 _MODULE_CONVERTERS = []
@@ -222,72 +296,97 @@ _MODULE_CONVERTERS += [
 # End of converters for reverb effects
 
 _MODULE_CONVERTERS += [
-    ModuleConverter(None, 0, "Passthru", "NONE", ()),
+    ModuleConverter(None, 0, "Passthru", "NONE", {}),
 ]
 
 
+# Index of module converters by (fuse_type, fuse_id).
+# Converters with fuse_type None (i.e. Passthru) match modules of
+# any type with the same fuse_id and are looked up as a fallback.
+_MC_BY_KEY = {}
+for mc in _MODULE_CONVERTERS:
+    mc_key = (mc.fuse_type, mc.fuse_id)
+    assert mc_key not in _MC_BY_KEY, f"Duplicate converter for {mc.fuse_type} {mc.fuse_id}"
+    _MC_BY_KEY[mc_key] = mc
+del mc, mc_key
+
+
 def fuse_mc_lookup(fuse_module_type, fuse_module_id):
-    matching_mcs = [
-        mc
-        for mc in _MODULE_CONVERTERS
-        if (
-            (mc.fuse_id == fuse_module_id) and
-            (
-                (mc.fuse_type is None) or
-                (mc.fuse_type == fuse_module_type)
-            )
-        )
-    ]
-    assert len(matching_mcs) == 1, f"Converter not found for {fuse_module_type} {fuse_module_id}"
-    return matching_mcs[0]
+    mc = _MC_BY_KEY.get((fuse_module_type, fuse_module_id))
+    if mc is None:
+        mc = _MC_BY_KEY.get((None, fuse_module_id))
+    assert mc is not None, f"Converter not found for {fuse_module_type} {fuse_module_id}"
+    return mc
 
 
 def fuse_pc_lookup(mc, fuse_param_id):
-    if mc.param_converters is not None:
-        return mc.param_converters.get(fuse_param_id, None)
-    else:
-        return None
+    return mc.param_converters.get(fuse_param_id)
+
+
+# FUSE parameter values are u16 integers serialized as element text.
+# A small number of values (e.g. 0, 33024, 65280, 65535) account for
+# most of the parameters in a typical preset collection, so the parsed
+# integer is cached by text.
+@lru_cache(maxsize=256)
+def _text_int(text):
+    return int(text)
+
+
+# unconverted_param_values, where supplied to the functions below,
+# may be any mutable mapping (the driver uses a
+# defaultdict(new_unconverted_param_entry)).
+# It maps (fuse_type, fuse_param_id, value) for each parameter
+# which has no converter to [total_count, Counter(fuse_id -> count)].
+def new_unconverted_param_entry():
+    return [0, Counter()]
 
 
 def convert_fuse_module(
     fuse_module_type, fuse_module_element,
     unconverted_param_values
 ):
+    module_body = fuse_module_element[0]
     mc = fuse_mc_lookup(
         fuse_module_type,
-        int(fuse_module_element[0].attrib.get("ID"))
+        int(module_body.attrib["ID"])
     )
+    param_plan = mc.param_plan
+    fuse_type = mc.fuse_type
+    fuse_id = mc.fuse_id
     json_params = {}
     ui_params = {}
-    for fuse_param_element in fuse_module_element[0]:
-        fuse_param_id = int(fuse_param_element.attrib.get("ControlIndex"))
+    for fuse_param_element in module_body:
+        fuse_param_id = int(fuse_param_element.attrib["ControlIndex"])
         try:
-            pc = fuse_pc_lookup(mc, fuse_param_id)
-            if pc is not None:
-                json_name = pc.json_param_name
-                adapted_value = pc.parameter_adaptor.fuse_to_json(
-                    int(fuse_param_element.text)
-                )
+            raw_text = fuse_param_element.text
+            raw_int = _text_int(raw_text)
+            plan_entry = (
+                param_plan[fuse_param_id]
+                if 0 <= fuse_param_id < len(param_plan) else None
+            )
+            if plan_entry is not None:
+                json_name, fuse_to_json, ui_name, json_to_ui = plan_entry
+                adapted_value = fuse_to_json(raw_int)
                 if adapted_value is None:
-                    print(f"Failed to adapt {pc} from value {fuse_param_element.text}")
+                    pc = fuse_pc_lookup(mc, fuse_param_id)
+                    print(f"Failed to adapt {pc} from value {raw_text}")
                     continue
                 json_params[json_name] = adapted_value
-                if isinstance(pc, EditableParamConverter) is True:
-                    assert len(pc.ui_param_name) > 0
-                    ui_name = pc.ui_param_name
-                    ui_value = pc.parameter_adaptor.json_to_ui(adapted_value)
-                    ui_params[ui_name] = ui_value
+                if json_to_ui is not None:
+                    ui_params[ui_name] = json_to_ui(adapted_value)
             else:
-                json_params["__"+str(fuse_param_id)] = fuse_param_element.text
+                json_params["__"+str(fuse_param_id)] = raw_text
                 if unconverted_param_values is not None:
-                    upv_key = (mc.fuse_type, fuse_param_id, int(fuse_param_element.text))
-                    upv_entry = unconverted_param_values.get(upv_key, [0, {}])
-                    upv_module_count = upv_entry[1].get(mc.fuse_id, 0)
-                    upv_entry[1][mc.fuse_id] = upv_module_count + 1
-                    upv_entry[0] = sum(upv_entry[1].values())
-                    unconverted_param_values[upv_key] = upv_entry
+                    upv_key = (fuse_type, fuse_param_id, raw_int)
+                    upv_entry = unconverted_param_values.get(upv_key)
+                    if upv_entry is None:
+                        upv_entry = unconverted_param_values[upv_key] = (
+                            new_unconverted_param_entry()
+                        )
+                    upv_entry[1][fuse_id] += 1
+                    upv_entry[0] += 1
         except Exception as e:
-            message = f"Attempting to process {mc.fuse_type} {mc.fuse_id} param {fuse_param_id}"
+            message = f"Attempting to process {fuse_type} {fuse_id} param {fuse_param_id}"
             traceback.print_exception(e)
             print(message)
             raise RuntimeError(message)
@@ -298,100 +397,154 @@ def convert_fuse_module(
     )
 
 
+# Tags of the effect modules which appear under the second child
+# of the root element of a FUSE preset, in signal chain order.
+_FX_ORDER = ("Stompbox", "Modulation", "Delay", "Reverb")
+
+
 def fuse_to_json(
     mk_stream,
     xml_stream=None,
     unconverted_param_values=None
 ):
     problems = []
+    # problems other than failed assertions are reported once per preset
+    seen_problems = set()
     json_modules = []
     ui_modules = []
     try:
-        preset_tree = ET.ElementTree(
-            ET.fromstring(str(mk_stream.read(), "utf-8"))
-        )
-        ET.indent(preset_tree.getroot())
+        preset_tree = ET.parse(mk_stream, _XML_PARSER)
+        root = preset_tree.getroot()
         if xml_stream is not None:
-            preset_tree.write(xml_stream, "unicode")
+            # The dump is always serialized by the stdlib so that the
+            # output does not depend on whether lxml is installed.
+            dump_root = (
+                _stdlib_ET.fromstring(ET.tostring(root)) if _USING_LXML
+                else root
+            )
+            _stdlib_ET.indent(dump_root)
+            _stdlib_ET.ElementTree(dump_root).write(xml_stream, "unicode")
 
-        fuse_amp_element = preset_tree.getroot()[0]
+        fuse_amp_element = root[0]
         assert fuse_amp_element.tag == "Amplifier"
 
-        fuse_stomp_element = preset_tree.getroot()[1][0]
-        assert fuse_stomp_element.tag == "Stompbox"
-
-        fuse_mod_element = preset_tree.getroot()[1][1]
-        assert fuse_mod_element.tag == "Modulation"
-
-        fuse_delay_element = preset_tree.getroot()[1][2]
-        assert fuse_delay_element.tag == "Delay"
-
-        fuse_reverb_element = preset_tree.getroot()[1][3]
-        assert fuse_reverb_element.tag == "Reverb"
+        # A missing effect module surfaces as a KeyError naming its tag
+        fx_by_tag = {e.tag: e for e in root[1]}
 
+        # Each module is converted once, amplifier first, so
+        # json_modules and ui_modules are in the order
+        # Amplifier, Stompbox, Modulation, Delay, Reverb.
         for fuse_element in (
             fuse_amp_element,
-            fuse_stomp_element, fuse_mod_element,
-            fuse_amp_element,
-            fuse_delay_element, fuse_reverb_element
+            *(fx_by_tag[tag] for tag in _FX_ORDER)
         ):
             try:
                 j, u = convert_fuse_module(
                     fuse_element.tag, fuse_element,
                     unconverted_param_values
                 )
-                json_modules += [j]
-                ui_modules += [u]
+                json_modules.append(j)
+                ui_modules.append(u)
             except AssertionError as e:
-                problems += [str(e)]
+                problem = str(e)
+                seen_problems.add(problem)
+                problems.append(problem)
             except Exception as e:
                 problem = str(e)
-                if problem in problems:
-                    # duplicate
-                    pass
-                else:
-                    problems += [problem]
+                if problem not in seen_problems:
+                    seen_problems.add(problem)
+                    problems.append(problem)
     except Exception as e:
         problem = str(e)
-        if problem in problems:
-            # duplicate
-            pass
-        else:
-            problems += [problem]
+        if problem not in seen_problems:
+            seen_problems.add(problem)
+            problems.append(problem)
 
     return problems, json_modules, ui_modules
 
 
+def _convert_fuse_file(outdir, fn, fuse_bytes, dump_xml):
+    # Converts a single preset for the batch driver below.
+    # This runs in a worker process, so the XML dump (if requested)
+    # is written here and the unconverted parameter values seen in
+    # this preset are returned for the parent process to merge.
+    unconverted_param_values = defaultdict(new_unconverted_param_entry)
+    if dump_xml:
+        with open(f"{outdir}/{os.path.basename(fn)}", "wt") as xml_stream:
+            failed_modules, json_modules, ui_modules = fuse_to_json(
+                io.BytesIO(fuse_bytes), xml_stream,
+                unconverted_param_values
+            )
+    else:
+        failed_modules, json_modules, ui_modules = fuse_to_json(
+            io.BytesIO(fuse_bytes), None,
+            unconverted_param_values
+        )
+    return failed_modules, json_modules, ui_modules, unconverted_param_values
+
+
 if __name__ == "__main__":
 
+    import argparse
+    from concurrent.futures import ProcessPoolExecutor
+    from itertools import repeat
     import json
-    import os
-    import xml.etree.ElementTree as ET
     import zipfile
 
+    arg_parser = argparse.ArgumentParser(
+        description="Convert the FUSE presets in a reference archive to JSON"
+    )
+    arg_parser.add_argument(
+        "--dump-xml", action="store_true",
+        help="also write an indented copy of each preset's FUSE XML to the output directory"
+    )
+    args = arg_parser.parse_args()
+
     which_zf = "intheblues"
     with zipfile.ZipFile(f"./_work/reference_files/{which_zf}.zip") as zf:
         outdir = f"output/{which_zf}"
         os.makedirs(outdir, exist_ok=True)
-        ui_params_stream = open(f"{outdir}/_ui_params.txt", "wt")
-        failures_stream = open(f"{outdir}/_failures.txt", "wt")
-        unconverted_param_values = {}
+        unconverted_param_values = defaultdict(new_unconverted_param_entry)
 
-        for fn in [
+        fns = [
             n
             for n in zf.namelist()
             if not n.startswith("__MACOSX") and n.endswith(".fuse")
-        ]:
+        ]
+        # Presets are independent of each other, so they are converted
+        # in parallel from bytes read here, and the results are
+        # collected in archive order.
+        with ProcessPoolExecutor() as executor:
+            results = list(executor.map(
+                _convert_fuse_file,
+                repeat(outdir), fns, [zf.read(fn) for fn in fns],
+                repeat(args.dump_xml),
+                chunksize=8
+            ))
+
+    # The summary streams collect a few lines per preset over the
+    # whole batch, so they are given a large buffer and are flushed
+    # and closed once at the end.
+    with (
+        open(f"{outdir}/_ui_params.txt", "wt", buffering=1 << 20) as ui_params_stream,
+        open(f"{outdir}/_failures.txt", "wt", buffering=1 << 20) as failures_stream
+    ):
+        for fn, (
+            failed_modules, json_modules, ui_modules, file_upvs
+        ) in zip(fns, results):
+            for upv_key, (file_count, file_module_counts) in file_upvs.items():
+                upv_entry = unconverted_param_values[upv_key]
+                upv_entry[0] += file_count
+                upv_entry[1].update(file_module_counts)
             output_fn = f"{outdir}/{os.path.basename(fn)}"
-            failed_modules, json_modules, ui_modules = fuse_to_json(
-                zf.open(fn), open(output_fn, "wt"),
-                unconverted_param_values
-            )
             if len(failed_modules) == 0:
                 output_fn = output_fn.replace(".fuse", ".json")
-                print(json.dumps([json_modules[i] for i in [1, 2, 3, 4, 5]], indent=4), file=open(output_fn, "wt"))
+                with open(output_fn, "wt") as json_stream:
+                    # The JSON preset format places the amplifier
+                    # between the modulation and delay effects.
+                    print(json.dumps([json_modules[i] for i in [1, 2, 0, 3, 4]], indent=4), file=json_stream)
                 print(f"\nUI parameters for {fn}", file=ui_params_stream)
-                for module in [ui_modules[i] for i in [0, 1, 2, 4, 5]]:
+                for module in ui_modules:
                     assert len(module.keys()) == 3
                     if module["module_type"] is not None:
                         print(
@@ -405,6 +558,8 @@ if __name__ == "__main__":
                     file=failures_stream
                 )
                 print(file=failures_stream)
-        unconverted_params_stream = open(f"{outdir}/_unconverted_params.txt", "wt")
+
+    with open(f"{outdir}/_unconverted_params.txt", "wt", buffering=1 << 20) as unconverted_params_stream:
         for k in sorted(unconverted_param_values.keys()):
-            print(k, unconverted_param_values[k], file=unconverted_params_stream)
+            upv_count, upv_module_counts = unconverted_param_values[k]
+            print(k, [upv_count, dict(upv_module_counts)], file=unconverted_params_stream)
@@ -55,25 +55,27 @@ def generate_classic_module_db(fuse_db=_DEFAULT_FUSE_DB):
                 dsp_item_type, dsp_item_name
             )
 
-    py_file = open("moonshinewrangler/generated/classic_modules.py", "wt")
-    py_file.writelines([
-        "FUSE_DSP_MODULES = {\n",])
-    for k in sorted(dsp_ids_to_types_and_names):
-        v = dsp_ids_to_types_and_names[k]
-        py_file.writelines([f"    {k:3d}: {v},\n"])
-    py_file.writelines(["}\n"])
+    sorted_items = sorted(dsp_ids_to_types_and_names.items())
+
+    with open("moonshinewrangler/generated/classic_modules.py", "wt") as py_file:
+        py_file.write(
+            "FUSE_DSP_MODULES = {\n" +
+            "".join(f"    {k:3d}: {v},\n" for k, v in sorted_items) +
+            "}\n"
+        )
 
     try:
-        java_file= open("../maneline/maneline-lib/src/main/java/net/heretical_camelid/maneline/lib/generated/FUSE_DSP_Module.java.RSN", "wt")
-        java_file.writelines([
-            "package net.maneline.lib.generated;\n"
-            "import net.maneline.lib.fuse.FUSE_DSP_Module;\n"
-            "FUSE_DSP_MODULES = {\n",
-        ])
-        for k in sorted(dsp_ids_to_types_and_names):
-            v = dsp_ids_to_types_and_names[k]
-            java_file.writelines([f'    {k:3d}: new FUSE_DSP_Module({k},{v[0]},"{v[1]}"),\n'])
-        java_file.writelines(["}\n"])        
+        with open("../maneline/maneline-lib/src/main/java/net/heretical_camelid/maneline/lib/generated/FUSE_DSP_Module.java.RSN", "wt") as java_file:
+            java_file.write(
+                "package net.maneline.lib.generated;\n"
+                "import net.maneline.lib.fuse.FUSE_DSP_Module;\n"
+                "FUSE_DSP_MODULES = {\n" +
+                "".join(
+                    f'    {k:3d}: new FUSE_DSP_Module({k},{v[0]},"{v[1]}"),\n'
+                    for k, v in sorted_items
+                ) +
+                "}\n"
+            )
     except FileNotFoundError:
         pass
 
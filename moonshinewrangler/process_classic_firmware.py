@@ -13,8 +13,9 @@ ending in roman numerals I to V with or without a 'v2'
 suffix.
 """
 
-import binascii
 import math
+import mmap
+import struct
 import zipfile
 
 """ Firmware releases made prior to 2016 were done as files
@@ -26,22 +27,34 @@ change, this function wraps the two formats and retrieves
 the .upd stream of bytes from either."""
 def get_upd_stream(path):
     if(path.endswith(".upd")):
-        return open(path).read()
+        # A read-only mapping supports find() and slicing like bytes
+        # without holding a second copy of the image in memory.
+        with open(path, "rb") as upd_file:
+            return mmap.mmap(upd_file.fileno(), 0, access=mmap.ACCESS_READ)
     elif path.endswith(".zip"):
-        zf = zipfile.ZipFile(path)
-        assert len(zf.filelist)==1, zf.filelist
-        assert zf.filelist[0].filename.endswith(".upd"), zf.filelist[0]
-        return zf.open(zf.filelist[0]).read()
+        with zipfile.ZipFile(path) as zf:
+            assert len(zf.filelist)==1, zf.filelist
+            assert zf.filelist[0].filename.endswith(".upd"), zf.filelist[0]
+            return zf.read(zf.filelist[0])
 
 """This script searches for any of a list of strings in the stream.
-Each time a target string is found, the file offset is printed 
-in hex and a hex dump is printed starting a fixed
+When verbose is True, each time a target string is found, the file
+offset is printed in hex and a hex dump is printed starting a fixed
 number of bytes before the string.
 """
 def find_strings_in_byte_stream(
-    byte_stream, target_strings, bytes_before, buffer_length, clazz=None
+    byte_stream, target_strings, bytes_before, buffer_length, clazz=None,
+    verbose=False
 ):
     num_16byte_blocks=math.ceil(buffer_length/16)
+    # The bounds of each 16 byte row of the dump are the same for every
+    # target string, so they are worked out once up front.
+    row_bounds = tuple(
+        (n*16, (n+1)*16) for n in range(0,num_16byte_blocks)
+    )
+    # Slices of a memoryview share the firmware image rather than
+    # copying it.
+    byte_view = memoryview(byte_stream)
     for s in target_strings:
         offset = 0
         s_bytes = s.encode("utf-8")
@@ -49,34 +62,34 @@ def find_strings_in_byte_stream(
         offset = byte_stream.find(s_bytes, offset+1)
         if offset == -1:
             return None
-        buffer = byte_stream[
+        buffer = byte_view[
             offset-bytes_before:
             offset-bytes_before+buffer_length
         ]
-        buffer_hex = str(binascii.b2a_hex(buffer),"utf-8")
-        end_offset = offset + buffer_length
-        found_line = "\n".join(
-            [f"{offset:08x} {s:20s}"] + 
-            [f"{buffer_hex[n*32:(n+1)*32]}" for n in range(0,num_16byte_blocks)] +
-            [f"{end_offset:08x}"]
-        )
+        if verbose:
+            end_offset = offset + buffer_length
+            print("\n".join(
+                [f"{offset:08x} {s:20s}"] +
+                [buffer[start:end].hex() for start, end in row_bounds] +
+                [f"{end_offset:08x}"]
+            ))
         # The clazz parameter is an optional type which can be used to 
         # instantiate a Python object containing the found string value.
         # If the parameter is not supplied, it is assumed that the function
-        # is being used to generate guesses, a dump is printed and the offset
-        # where the string was found is returned.
+        # is being used to generate guesses (typically with verbose=True so
+        # that a dump is printed) and the offset where the string was found
+        # is returned.
         if clazz is None:
-            print(found_line)
             return offset
         else:
+            # ClassicPreset and ClassicName keep a copy of just their own
+            # record, so passing the whole stream does not pin it.
             return clazz(byte_stream,offset)
 
 
 def nul_terminated_string(byte_string):
-    first_nul_pos = byte_string.find(0)
-    if first_nul_pos!=-1:
-        byte_string = byte_string[0:first_nul_pos]
-    return str(byte_string,"utf-8")
+    # byte_string may be a memoryview, which has no partition() method
+    return bytes(byte_string).partition(b"\x00")[0].decode("utf-8")
 
 """Based on the observations documented in function _preset_table_investigation(...)
 I believe that the representation of presets in classic firmware is as follows:
@@ -90,23 +103,73 @@ I believe that the representation of presets in classic firmware is as follows:
 + bytes 62, 63-79: module id, parameters for slot 1 effect
 + bytes 80, 81-97: module id, parameters for slot 2 effect
 + bytes 98, 99-115: module id, parameters for slot 3 effect
++ bytes 116-119: unknown (each preset occupies 0x78 bytes)
 """
+_PRESET_STRUCT = struct.Struct("<20sB23xB17xB17xB17xB21x")
+assert _PRESET_STRUCT.size == 0x78
+
 class ClassicPreset(dict):
     def __init__(self, byte_stream, offset):
-        self.byte_stream = byte_stream[offset:offset+0x78]
-        self["name"]=nul_terminated_string(self.byte_stream[0:20])
-        self["amp_id"]=self.byte_stream[20]
-        self["fx"] = [ self.byte_stream[44+(slot*18)] for slot in range(0,4)]
+        name, amp_id, *fx = _PRESET_STRUCT.unpack_from(byte_stream, offset)
+        self.byte_stream = bytes(byte_stream[offset:offset+_PRESET_STRUCT.size])
+        self["name"]=nul_terminated_string(name)
+        self["amp_id"]=amp_id
+        self["fx"] = fx
 
     def effect_id(self,slot):
         return self.byte_stream[44+(slot*18)]
-    
+
+"""The preset table is a contiguous run of fixed size preset records,
+so in addition to decoding presets one at a time as ClassicPreset
+objects, the table can be queried a column at a time: a strided
+slice of the table bytes yields (say) the amp id of every preset
+in a single C-level operation, without creating a Python object
+per preset."""
+class ClassicPresetTable:
+    def __init__(self, byte_stream, offset, num_presets):
+        self.num_presets = num_presets
+        self.byte_stream = byte_stream[
+            offset:offset+(num_presets*_PRESET_STRUCT.size)
+        ]
+
+    def preset(self, index):
+        return ClassicPreset(self.byte_stream, index*_PRESET_STRUCT.size)
+
+    def amp_ids(self):
+        return self.byte_stream[20::_PRESET_STRUCT.size]
+
+    def effect_ids(self, slot):
+        return self.byte_stream[44+(slot*18)::_PRESET_STRUCT.size]
+
+    def names(self):
+        # The name column is not single bytes, so rather than a strided
+        # slice the whole table is decoded in one iter_unpack pass.
+        # If the stream ended part way through the table, the trailing
+        # partial record has no complete name and is left out.
+        whole_records_size = (
+            len(self.byte_stream) // _PRESET_STRUCT.size * _PRESET_STRUCT.size
+        )
+        return [
+            nul_terminated_string(name)
+            for name, *_ in _PRESET_STRUCT.iter_unpack(
+                self.byte_stream[:whole_records_size]
+            )
+        ]
+
+    def presets_using_amp(self, amp_id):
+        return [ i for i, a in enumerate(self.amp_ids()) if a == amp_id ]
+
 class ClassicName:
     def __init__(self, byte_stream, offset, encoding="utf-8"):
-        byte_stream=byte_stream[offset:]
-        self.nts = nul_terminated_string(byte_stream)
+        # Locate the NUL in place rather than copying the whole tail of
+        # the firmware image for each name.
         # The byte stream for the name includes the terminating NUL
-        self.byte_stream=byte_stream[:len(self.nts)+1]
+        # (if there is none, the name runs to the end of the stream).
+        end_offset = byte_stream.find(b"\x00", offset)
+        if end_offset == -1:
+            end_offset = len(byte_stream) - 1
+        self.byte_stream=bytes(byte_stream[offset:end_offset+1])
+        self.nts = nul_terminated_string(self.byte_stream)
     def __str__(self):
         return self.nts
 
@@ -128,7 +191,7 @@ def _preset_table_investigation(upd_stream):
             "Brutal Metal II", 
             "Super-Live Album", 
             "Chimey Deluxe"
-        ], 0x80, 0x200,None 
+        ], 0x80, 0x200, None, verbose=True
     )
     print("\n    ".join([
         "Observations from scan 1:",
@@ -145,26 +208,26 @@ if __name__ == "__main__":
     # The offset into the firmware of the start of the preset table
     # is found by searching for the name of preset #0
     preset_offset = find_strings_in_byte_stream(
-        m1v2_upd_bytes, [ "Brutal Metal II", ], 0x00, 0x200, None 
+        m1v2_upd_bytes, [ "Brutal Metal II", ], 0x00, 0x200, None, verbose=True
     )
 
-    presets = []
-    for i in range(0,24):
-        preset = ClassicPreset(m1v2_upd_bytes,preset_offset)
-        amp_desc = preset["amp_id"]
-        fx_desc = ",".join([ str(fx_id) for fx_id in preset["fx"]])
-        print(
-            f"preset {i:03}: {preset["name"]} amp={amp_desc} effects={fx_desc}"
-        )
-        preset_offset += len(preset.byte_stream)
-        presets += [ preset ]
+    preset_table = ClassicPresetTable(m1v2_upd_bytes, preset_offset, 24)
+    # The listing is assembled from whole columns of the table rather
+    # than by decoding each preset separately.
+    amp_ids = preset_table.amp_ids()
+    fx_ids = [ preset_table.effect_ids(slot) for slot in range(0,4) ]
+    for i, name in enumerate(preset_table.names()):
+        fx_desc = ",".join([ str(fx_column[i]) for fx_column in fx_ids ])
+        print(f"preset {i:03}: {name} amp={amp_ids[i]} effects={fx_desc}")
+    for amp_id in sorted(set(preset_table.amp_ids())):
+        print(f"amp {amp_id:3d} used by presets {preset_table.presets_using_amp(amp_id)}")
 
 
     # The offset into the firmware of the start of the list of 
     # DSP module names is found by searching for the name of 
     # module #100
     name_offset = find_strings_in_byte_stream(
-        m1v2_upd_bytes, [ "Invalid", ], 0x80, 0x200, None 
+        m1v2_upd_bytes, [ "Invalid", ], 0x80, 0x200, None, verbose=True
     )
     dsp_module_names = []
     for i in range(0,89):
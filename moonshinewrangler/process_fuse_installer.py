@@ -6,10 +6,12 @@
 # library which, for copyright and other reasons, we prefer not
 # to store in version control.
 
+import gzip
 import os
 import re
 import subprocess
 import urllib.parse
+import xml.etree.ElementTree as ET
 
 
 def _extract_file_bytes_from_dmg(dmg_path, file_entry_path):
@@ -19,27 +21,34 @@ def _extract_file_bytes_from_dmg(dmg_path, file_entry_path):
     return sp_result.stdout
 
 
-def extract_fender_fuse_exe_strings():
+# Equivalent to the default behaviour of /usr/bin/strings: runs of at
+# least 4 printable ASCII characters (including tab).
+_PRINTABLE_STRING_REGEX = re.compile(rb"[\x20-\x7e\t]{4,}")
+
+
+def _extract_fender_fuse_exe_bytes():
     pax_archive_bytes = _extract_file_bytes_from_dmg(
         "_work/reference_files/FenderFUSE_FULL_2.7.1.dmg",
         "Fender FUSE Installer/Fender FUSE Installer.app/Contents/Resources/Fender FUSE.pkg/Contents/Archive.pax.gz"
     )
     # The byte stream pax_archive_bytes is actually a gzipped pax archive,
     # but the only file it contains is the FUSE (Windows/Mono/Silverlight)
-    # binary executable so we run strings on the decompressed stream as
+    # binary executable so we treat the decompressed stream as
     # if it were the bare executable
-    pax_cmd = "/usr/bin/gzip -d | /usr/bin/strings"
-    sp_result = subprocess.run(
-        pax_cmd, shell=True, capture_output=True,
-        input=pax_archive_bytes
-    )
-    assert sp_result.returncode == 0
-    return str(sp_result.stdout, "utf-8").split("\n")
+    return gzip.decompress(pax_archive_bytes)
+
+
+def extract_fender_fuse_exe_strings():
+    return [
+        str(match.group(), "ascii")
+        for match in _PRINTABLE_STRING_REGEX.finditer(
+            _extract_fender_fuse_exe_bytes()
+        )
+    ]
 
 
 def extract_fender_fuse_db_xml(fuse_xml_path):
-    fuse_exe_strings = extract_fender_fuse_exe_strings()
-    fuse_fx_db_lines = []
+    exe_bytes = _extract_fender_fuse_exe_bytes()
     # The executable inside the archive contains an XML stream with
     # root element with tag <FXDataBase>.
     # Inside the root element there are multiple elements with tag <Product>,
@@ -47,40 +56,75 @@ def extract_fender_fuse_db_xml(fuse_xml_path):
     # (amplifier) product or group of products supported by the FUSE application.
     # We choose to preserve one XML file containing the full data and also 
     # separate XML files for each product/group.
-    line_array_index = 0
-    full_xml_file = None
-    product_xml_file = None
-    product_start_regex = re.compile(r'<Product Name="([^"]+)" ID="(\d+)">')
+    db_start = exe_bytes.find(b"<FXDataBase ")
+    assert db_start != -1
+    xml_declaration = b'<?xml version="1.0" encoding="utf-8"?>'
+    xml_start = exe_bytes.rfind(xml_declaration, 0, db_start)
+    assert xml_start != -1
+    # Only whitespace may lie between the declaration and the root element,
+    # otherwise the declaration found belongs to some other stream.
+    assert exe_bytes[xml_start+len(xml_declaration):db_start].strip() == b""
+    xml_end = exe_bytes.find(b"</FXDataBase>", db_start)
+    assert xml_end != -1
+    xml_end += len(b"</FXDataBase>")
+    fuse_db_xml_bytes = exe_bytes[xml_start:xml_end]
     os.makedirs(fuse_xml_path, exist_ok=True)
 
-    while line_array_index < len(fuse_exe_strings):
-        line = fuse_exe_strings[line_array_index]
-        if line.startswith("<FXDataBase "):
-            assert line_array_index>0
-            previous_line = fuse_exe_strings[line_array_index-1]
-            assert '<?xml version="1.0" encoding="utf-8"?>' in previous_line
-            full_xml_file = open(os.path.join(fuse_xml_path,"all_products.xml"),"wt")
-            print(previous_line, file=full_xml_file)
-            # current line will be output at end of loop
-        elif "</FXDataBase>" in line:
-            print(line, file=full_xml_file)
-            full_xml_file = None
-            break
-        elif '</Product>' in line:
-            print(line,file=product_xml_file)
-            product_xml_file=None
-        elif product_start_regex.search(line):
-            match = product_start_regex.search(line)
-            product_name = match.group(1)
+    # The full database is saved exactly as it appears in the executable
+    with open(os.path.join(fuse_xml_path,"all_products.xml"),"wb") as full_xml_file:
+        full_xml_file.write(fuse_db_xml_bytes + b"\n")
+
+    # The database is then fed through expat in chunks, and each
+    # <Product> element is written out as soon as its end tag has
+    # been parsed and then discarded.
+    parser = ET.XMLPullParser(events=("start", "end"))
+    open_elements = []
+    product_indent = ""
+    chunk_size = 1 << 16
+    for chunk_start in range(0, len(fuse_db_xml_bytes), chunk_size):
+        parser.feed(fuse_db_xml_bytes[chunk_start:chunk_start+chunk_size])
+        for event, element in parser.read_events():
+            if event == "start":
+                if element.tag == "Product" and len(open_elements) > 0:
+                    # The product's own indent is the last line of the
+                    # whitespace preceding its start tag, which is either
+                    # the parent's text or the previous sibling's tail.
+                    # Events are only read once a whole chunk has been fed,
+                    # so later siblings may already have been appended to
+                    # the parent and the product need not be its last child.
+                    parent = open_elements[-1]
+                    i = list(parent).index(element)
+                    preceding_text = (
+                        parent[i-1].tail if i else parent.text
+                    ) or ""
+                    product_indent = preceding_text.rpartition("\n")[2]
+                open_elements.append(element)
+                continue
+            open_elements.pop()
+            if element.tag != "Product":
+                continue
             # make product_name filename safe
-            product_name = product_name.replace(" ","_").replace("/","+")
-            product_xml_filename = f"product{match.group(2)}-{product_name}.xml"
-            product_xml_file = open(os.path.join(fuse_xml_path,product_xml_filename),"wt")
-            # current line will be output at end of loop
-        for stream in ( full_xml_file, product_xml_file):
-            if stream is not None:
-                print(line,file=stream)
-        line_array_index += 1
+            product_name = element.get("Name").replace(" ","_").replace("/","+")
+            product_xml_filename = f"product{element.get('ID')}-{product_name}.xml"
+            # The whitespace following the product's end tag belongs
+            # to the enclosing database, not to the product, so it is
+            # replaced by a single newline.  Leading the file with the
+            # product's indent keeps its lines aligned with the same
+            # lines in all_products.xml.
+            tail = element.tail
+            element.tail = None
+            with open(
+                os.path.join(fuse_xml_path,product_xml_filename),"wt",
+                encoding="utf-8"
+            ) as product_xml_file:
+                product_xml_file.write(
+                    product_indent + ET.tostring(element, encoding="unicode") + "\n"
+                )
+            # The tail is kept because the next product's indent is
+            # taken from it.
+            element.clear()
+            element.tail = tail
+    parser.close()
 
 if __name__ == "__main__":
     extract_fender_fuse_db_xml("_work/fuse_data")
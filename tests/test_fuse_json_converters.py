@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+import ast
+import contextlib
+import glob
+import io
+import json
+import os
+import sys
+import unittest
+import xml.etree.ElementTree
+from unittest import mock
+
+_BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+_PRESET_DIR = os.path.join(_BASE_DIR, 'output', 'intheblues')
+
+# fuse_json_converters imports its sibling modules as a script would
+sys.path.insert(0, os.path.join(_BASE_DIR, 'moonshinewrangler'))
+
+import fuse_json_converters as fjc  # noqa: E402
+
+
+def _read(fuse_path):
+    with open(fuse_path, 'rb') as fuse_file:
+        return fuse_file.read()
+
+
+def _convert(fuse_bytes, use_stdlib):
+    # Returns everything fuse_to_json produces for one preset,
+    # using either the stdlib ElementTree path or whichever
+    # path the module selected on import.
+    xml_stream = io.StringIO()
+    unconverted_param_values = {}
+    if use_stdlib:
+        patcher = mock.patch.multiple(
+            fjc, ET=xml.etree.ElementTree,
+            _USING_LXML=False, _XML_PARSER=None
+        )
+    else:
+        patcher = contextlib.nullcontext()
+    with patcher:
+        problems, json_modules, ui_modules = fjc.fuse_to_json(
+            io.BytesIO(fuse_bytes), xml_stream, unconverted_param_values
+        )
+    return (
+        problems, json_modules, ui_modules,
+        unconverted_param_values, xml_stream.getvalue()
+    )
+
+
+class FuseToJsonTestSuite(unittest.TestCase):
+    """Conversion of the checked-in intheblues presets."""
+
+    def test_stdlib_output_matches_recorded_json(self):
+        json_paths = sorted(glob.glob(os.path.join(_PRESET_DIR, '*.json')))
+        self.assertTrue(json_paths)
+        for json_path in json_paths:
+            with self.subTest(preset=os.path.basename(json_path)):
+                problems, json_modules, _, _, _ = _convert(
+                    _read(json_path.replace('.json', '.fuse')),
+                    use_stdlib=True
+                )
+                self.assertEqual(problems, [])
+                with open(json_path) as json_file:
+                    recorded = json.load(json_file)
+                # Same module order and round trip as the batch driver
+                converted = json.loads(json.dumps(
+                    [json_modules[i] for i in [1, 2, 0, 3, 4]]
+                ))
+                self.assertEqual(converted, recorded)
+
+    def test_summaries_match_recorded_summaries(self):
+        # Each module is converted once per preset, so every missing
+        # converter is reported once and every unconverted value is
+        # counted once.
+        recorded_failures = {}
+        with open(os.path.join(_PRESET_DIR, '_failures.txt')) as stream:
+            for block in stream.read().split('\n\n'):
+                if block.strip():
+                    heading, *problems = block.strip().split('\n')
+                    fn = heading.partition(' for ')[2]
+                    recorded_failures[os.path.basename(fn)] = problems
+        recorded_upvs = {}
+        with open(
+            os.path.join(_PRESET_DIR, '_unconverted_params.txt')
+        ) as stream:
+            for line in stream:
+                key, _, entry = line.partition(') ')
+                recorded_upvs[ast.literal_eval(key + ')')] = (
+                    ast.literal_eval(entry)
+                )
+
+        failures = {}
+        upvs = {}
+        for fuse_path in glob.glob(os.path.join(_PRESET_DIR, '*.fuse')):
+            problems, _, _, file_upvs, _ = _convert(
+                _read(fuse_path), use_stdlib=True
+            )
+            if problems:
+                failures[os.path.basename(fuse_path)] = problems
+            for key, (count, module_counts) in file_upvs.items():
+                entry = upvs.setdefault(key, [0, {}])
+                entry[0] += count
+                for fuse_id, module_count in module_counts.items():
+                    entry[1][fuse_id] = (
+                        entry[1].get(fuse_id, 0) + module_count
+                    )
+        self.assertEqual(failures, recorded_failures)
+        self.assertEqual(upvs, recorded_upvs)
+
+    def test_xml_dump_matches_recorded_dump(self):
+        # The checked-in presets are themselves --dump-xml output,
+        # so dumping them again must reproduce them exactly.
+        fuse_paths = sorted(glob.glob(os.path.join(_PRESET_DIR, '*.fuse')))
+        self.assertTrue(fuse_paths)
+        for fuse_path in fuse_paths:
+            with self.subTest(preset=os.path.basename(fuse_path)):
+                fuse_bytes = _read(fuse_path)
+                xml_dump = _convert(fuse_bytes, use_stdlib=True)[4]
+                self.assertEqual(xml_dump, fuse_bytes.decode('utf-8'))
+
+    @unittest.skipUnless(fjc._USING_LXML, 'lxml is not installed')
+    def test_lxml_output_matches_stdlib(self):
+        fuse_paths = sorted(glob.glob(os.path.join(_PRESET_DIR, '*.fuse')))
+        self.assertTrue(fuse_paths)
+        for fuse_path in fuse_paths:
+            with self.subTest(preset=os.path.basename(fuse_path)):
+                fuse_bytes = _read(fuse_path)
+                self.assertEqual(
+                    _convert(fuse_bytes, use_stdlib=False),
+                    _convert(fuse_bytes, use_stdlib=True)
+                )
+
+    @unittest.skipUnless(fjc._USING_LXML, 'lxml is not installed')
+    def test_lxml_ignores_comments_and_processing_instructions(self):
+        fuse_bytes = _read(os.path.join(_PRESET_DIR, 'mustangv2335.fuse'))
+        module_start = b'<Module ID="114" POS="0" BypassState="1">'
+        self.assertIn(module_start, fuse_bytes)
+        annotated_bytes = fuse_bytes.replace(
+            module_start,
+            module_start + b'<!-- a comment --><?fuse-note hint?>'
+        )
+        expected = _convert(fuse_bytes, use_stdlib=True)
+        self.assertEqual(expected[0], [])
+        for use_stdlib in (False, True):
+            with self.subTest(use_stdlib=use_stdlib):
+                self.assertEqual(
+                    _convert(annotated_bytes, use_stdlib), expected
+                )
+
+
+if __name__ == '__main__':
+    unittest.main()
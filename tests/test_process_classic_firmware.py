@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import unittest
+
+_BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(_BASE_DIR, 'moonshinewrangler'))
+
+import process_classic_firmware as pcf  # noqa: E402
+
+# (name, amp id, slot 0-3 effect ids) for each preset in the table
+_PRESETS = [
+    ('Brutal Metal II', 100, [1, 2, 3, 4]),
+    ('Super-Live Album', 103, [5, 0, 6, 7]),
+    ('Chimey Deluxe', 100, [8, 9, 0, 10]),
+]
+
+
+def _preset_record(name, amp_id, fx_ids):
+    # Builds one 0x78 byte record from the layout documented with
+    # _PRESET_STRUCT, filling the parameter and unknown bytes with a
+    # value no id in the table uses so a misplaced read shows up.
+    record = bytearray(b'\xee' * 0x78)
+    record[0:20] = name.encode('utf-8').ljust(20, b'\x00')
+    record[20] = amp_id
+    for slot, fx_id in enumerate(fx_ids):
+        record[44+(slot*18)] = fx_id
+    return bytes(record)
+
+
+class ClassicPresetTableTestSuite(unittest.TestCase):
+    """Decoding a synthetic preset table laid out like the firmware's."""
+
+    def setUp(self):
+        # The table sits part way into the stream, as it does in firmware
+        self.offset = 0x30
+        byte_stream = (
+            b'\xff' * self.offset
+            + b''.join(_preset_record(*p) for p in _PRESETS)
+            + b'\xff' * 0x40
+        )
+        self.table = pcf.ClassicPresetTable(
+            byte_stream, self.offset, len(_PRESETS)
+        )
+
+    def test_preset_struct_covers_one_record(self):
+        self.assertEqual(pcf._PRESET_STRUCT.size, 0x78)
+        self.assertEqual(len(self.table.byte_stream), 0x78 * len(_PRESETS))
+
+    def test_preset(self):
+        for i, (name, amp_id, fx_ids) in enumerate(_PRESETS):
+            with self.subTest(preset=i):
+                preset = self.table.preset(i)
+                self.assertEqual(preset['name'], name)
+                self.assertEqual(preset['amp_id'], amp_id)
+                self.assertEqual(list(preset['fx']), fx_ids)
+                for slot, fx_id in enumerate(fx_ids):
+                    self.assertEqual(preset.effect_id(slot), fx_id)
+
+    def test_amp_ids(self):
+        self.assertEqual(
+            list(self.table.amp_ids()), [p[1] for p in _PRESETS]
+        )
+
+    def test_effect_ids(self):
+        for slot in range(4):
+            with self.subTest(slot=slot):
+                self.assertEqual(
+                    list(self.table.effect_ids(slot)),
+                    [p[2][slot] for p in _PRESETS]
+                )
+
+    def test_names(self):
+        self.assertEqual(self.table.names(), [p[0] for p in _PRESETS])
+
+    def test_names_of_truncated_table(self):
+        # A stream ending part way through the last record yields the
+        # names of the complete records only.
+        byte_stream = b''.join(_preset_record(*p) for p in _PRESETS)
+        table = pcf.ClassicPresetTable(
+            byte_stream[:-0x10], 0, len(_PRESETS)
+        )
+        self.assertEqual(table.names(), [p[0] for p in _PRESETS[:-1]])
+
+    def test_presets_using_amp(self):
+        self.assertEqual(self.table.presets_using_amp(100), [0, 2])
+        self.assertEqual(self.table.presets_using_amp(103), [1])
+        self.assertEqual(self.table.presets_using_amp(0xee), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+import gzip
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+_BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(_BASE_DIR, 'moonshinewrangler'))
+
+import process_fuse_installer as pfi  # noqa: E402
+
+_FUSE_DB_XML = b'\n'.join([
+    b'<?xml version="1.0" encoding="utf-8"?>',
+    b'<FXDataBase Version="1">',
+    b'  <Product Name="Mustang I/II" ID="1">',
+    b'    <Amp ID="83" Name="Fender 57 Deluxe" />',
+    b'    <Stomp ID="60">Overdrive &amp; more</Stomp>',
+    b'  </Product>',
+    b'  <Other />',
+    b'  <Product Name="Big Amp" ID="22">',
+    b'    <Amp ID="94" />',
+    b'  </Product>',
+    b'</FXDataBase>',
+])
+
+# Siblings indented differently, so each product's indent has to be
+# taken from the text immediately before it rather than from whichever
+# element happens to be the parent's second last child.
+_UNEVEN_FUSE_DB_XML = b'\n'.join([
+    b'<?xml version="1.0" encoding="utf-8"?>',
+    b'<FXDataBase Version="1">',
+    b'  <Product Name="First" ID="1">',
+    b'    <Amp ID="83" />',
+    b'  </Product>',
+    b'      <Other />',
+    b'    <Product Name="Second" ID="2">',
+    b'      <Amp ID="94" />',
+    b'    </Product>',
+    b'        <Other />',
+    b'</FXDataBase>',
+])
+
+
+class ExtractFenderFuseDbXmlTestSuite(unittest.TestCase):
+    """Splitting the database embedded in the FUSE executable."""
+
+    def _extract(self, fuse_db_xml, fuse_xml_path):
+        # The database sits between binary junk in the executable,
+        # which reaches this function gzipped inside the installer.
+        exe_bytes = b'\x00\x01junk\x00' + fuse_db_xml + b'\x00\xffmore'
+        with mock.patch.object(
+            pfi, '_extract_file_bytes_from_dmg',
+            return_value=gzip.compress(exe_bytes)
+        ):
+            pfi.extract_fender_fuse_db_xml(fuse_xml_path)
+
+    def _assert_products_line_up(self, fuse_db_xml, first_lines):
+        with tempfile.TemporaryDirectory() as fuse_xml_path:
+            self._extract(fuse_db_xml, fuse_xml_path)
+            self.assertEqual(
+                sorted(os.listdir(fuse_xml_path)),
+                sorted(['all_products.xml'] + list(first_lines))
+            )
+            with open(
+                os.path.join(fuse_xml_path, 'all_products.xml'), 'rb'
+            ) as stream:
+                self.assertEqual(stream.read(), fuse_db_xml + b'\n')
+            db_lines = fuse_db_xml.decode('utf-8').split('\n')
+            for fn, first_line in first_lines.items():
+                with self.subTest(product=fn):
+                    with open(
+                        os.path.join(fuse_xml_path, fn), encoding='utf-8'
+                    ) as stream:
+                        product_text = stream.read()
+                    self.assertTrue(product_text.endswith('</Product>\n'))
+                    product_lines = product_text[:-1].split('\n')
+                    expected_lines = db_lines[
+                        first_line:first_line+len(product_lines)
+                    ]
+                    # The database above writes empty elements the way
+                    # ElementTree serializes them, so each line of the
+                    # product file matches all_products.xml exactly.
+                    self.assertEqual(product_lines, expected_lines)
+
+    def test_product_files_line_up_with_all_products(self):
+        self._assert_products_line_up(_FUSE_DB_XML, {
+            'product1-Mustang_I+II.xml': 2,
+            'product22-Big_Amp.xml': 7,
+        })
+
+    def test_product_indent_comes_from_preceding_whitespace(self):
+        self._assert_products_line_up(_UNEVEN_FUSE_DB_XML, {
+            'product1-First.xml': 2,
+            'product2-Second.xml': 6,
+        })
+
+    def test_declaration_must_precede_database(self):
+        # A declaration separated from the database by anything other
+        # than whitespace belongs to some other stream.
+        fuse_db_xml = _FUSE_DB_XML.replace(
+            b'<FXDataBase ', b'<Unrelated />\n<FXDataBase ', 1
+        )
+        with tempfile.TemporaryDirectory() as fuse_xml_path:
+            with self.assertRaises(AssertionError):
+                self._extract(fuse_db_xml, fuse_xml_path)
+
+
+if __name__ == '__main__':
+    unittest.main()